@@ -1,41 +1,132 @@
 import streamlit as st
+from streamlit.runtime.scriptrunner import get_script_run_ctx
 from langchain_groq import ChatGroq
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.output_parsers import StrOutputParser
 from langchain_core.messages import HumanMessage, SystemMessage
+from langchain_core.globals import set_llm_cache
+from langchain_community.cache import SQLiteCache
 import pandas as pd
+from markdown_it import MarkdownIt
+import httpx
 import datetime
-import re
+import asyncio
+import json
+from dataclasses import dataclass, asdict
+import threading
+import logging
+import queue
+import time
+from collections import Counter
+import re2
 import os
 from dotenv import load_dotenv
 
 # Load environment variables
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
+@dataclass(slots=True)
+class LeadData:
+    """Answers collected from a lead during the conversation"""
+    budget: int | None = None
+    timeline: int | None = None
+    interest_level: int | None = None
+    name: str | None = None
+    email: str | None = None
+    phone: str | None = None
+    scheduled: bool | None = None
+
 # Initialize session state
 if "messages" not in st.session_state:
     st.session_state.messages = []
 if "lead_data" not in st.session_state:
-    st.session_state.lead_data = {}
+    st.session_state.lead_data = LeadData()
 if "conversation_stage" not in st.session_state:
     st.session_state.conversation_stage = "greeting"
 if "analytics" not in st.session_state:
     st.session_state.analytics = {
-        "interactions": [],
         "conversion_rate": 0,
-        "lead_scores": []
+        "lead_scores": [],
+        "total_leads": 0,
+        "category_counts": Counter()
     }
+if "follow_up" not in st.session_state:
+    st.session_state.follow_up = None
+if "lead_summaries" not in st.session_state:
+    st.session_state.lead_summaries = {}
 
 # Groq Configuration
 GROQ_API_KEY = st.secrets["GROQ_API_KEY"]
 
-def init_groq():
+# Serve repeated prompts from a local cache instead of a Groq round-trip.
+# Cached prompts include lead details in plaintext, so the file is owner-only.
+LLM_CACHE_PATH = ".langchain_cache.db"
+
+@st.cache_resource(show_spinner=False)
+def init_llm_cache():
+    """Install the SQLite LLM cache once per process rather than on every rerun"""
+    os.close(os.open(LLM_CACHE_PATH, os.O_CREAT | os.O_WRONLY, 0o600))
+    set_llm_cache(SQLiteCache(database_path=LLM_CACHE_PATH))
+
+init_llm_cache()
+
+# Model tiers: "instant" for short conversational text, "fast70b" for qualification reasoning
+MODEL_TIERS = {
+    "instant": "llama-3.1-8b-instant",
+    "fast70b": "llama-3.3-70b-specdec"
+}
+
+@st.cache_resource(show_spinner=False)
+def get_http_client():
+    """Shared keep-alive HTTP/2 connection pool for all Groq calls"""
+    return httpx.Client(
+        limits=httpx.Limits(max_connections=32, max_keepalive_connections=32),
+        http2=True,
+        timeout=60
+    )
+
+@st.cache_resource(show_spinner=False)
+def get_llm(tier="fast70b"):
+    """Create one Groq client per model tier and reuse it across reruns"""
     return ChatGroq(
         groq_api_key=GROQ_API_KEY,
-        model_name="llama-3.3-70b-specdec",
-        temperature=0.3
+        model_name=MODEL_TIERS[tier],
+        temperature=0,
+        streaming=True,
+        http_client=get_http_client()
     )
 
+# Follow-up message sent to a lead once qualification is complete
+FOLLOW_UP_PROMPT = ChatPromptTemplate.from_messages([
+    ("system", "You are a friendly sales assistant for Opolla. Write a short, warm "
+               "follow-up message (2-3 sentences) to a new lead that reflects their project details."),
+    ("human", "Name: {name}\nBudget (USD): {budget}\nTimeline (days): {timeline}\nUrgency (1-10): {interest_level}")
+])
+
+FOLLOW_UP_FALLBACK = "Our team will be in touch shortly to discuss your project."
+
+# Internal notes generated for the sales team, one task per LLM call
+SALES_NOTES_PROMPT = ChatPromptTemplate.from_messages([
+    ("system", "You are a sales analyst at Opolla. Answer in one concise sentence."),
+    ("human", "{task}\n\nBudget (USD): {budget}\nTimeline (days): {timeline}\nUrgency (1-10): {interest_level}")
+])
+SALES_NOTES_TASKS = {
+    "summary": "Summarise this lead for the sales team.",
+    "next_action": "Recommend the single best next action for the sales team on this lead."
+}
+
+# Handoff summaries for collected leads, checkpointed so interrupted runs resume
+HANDOFF_PROMPT = ChatPromptTemplate.from_messages([
+    ("system", "You are a sales analyst at Opolla. Write a short handoff brief (3-4 bullet points) "
+               "for the account executive taking over this lead."),
+    ("human", "Name: {name}\nCategory: {category}\nBudget (USD): {budget}\nTimeline (days): {timeline}\n"
+              "Urgency (1-10): {interest_level}\nSummary: {summary}\nNext action: {next_action}")
+])
+LEAD_SUMMARIES_PATH = "lead_summaries.jsonl"
+SUMMARY_CONCURRENCY = 20
+
 # Qualification Criteria
 QUALIFICATION_CRITERIA = {
     "budget": {"threshold": 10000, "weight": 0.4},
@@ -43,117 +134,241 @@ QUALIFICATION_CRITERIA = {
     "interest_level": {"threshold": 7, "weight": 0.3}
 }
 
+# Thresholds and weights (as points out of 100), resolved once at import
+BUDGET_THRESHOLD = QUALIFICATION_CRITERIA["budget"]["threshold"]
+TIMELINE_THRESHOLD = QUALIFICATION_CRITERIA["timeline"]["threshold"]
+INTEREST_THRESHOLD = QUALIFICATION_CRITERIA["interest_level"]["threshold"]
+BUDGET_POINTS = QUALIFICATION_CRITERIA["budget"]["weight"] * 100
+TIMELINE_POINTS = QUALIFICATION_CRITERIA["timeline"]["weight"] * 100
+INTEREST_POINTS = QUALIFICATION_CRITERIA["interest_level"]["weight"] * 100
+
 def qualify_lead(lead_data):
     """Score and categorize leads"""
-    score = 0
-    try:
-        budget = float(lead_data.get("budget", 0))
-        timeline = int(lead_data.get("timeline", 999))
-        interest_level = int(lead_data.get("interest_level", 0))
-        
-        if budget >= QUALIFICATION_CRITERIA["budget"]["threshold"]:
-            score += QUALIFICATION_CRITERIA["budget"]["weight"] * 100
-        
-        if timeline <= QUALIFICATION_CRITERIA["timeline"]["threshold"]:
-            score += QUALIFICATION_CRITERIA["timeline"]["weight"] * 100
-        
-        if interest_level >= QUALIFICATION_CRITERIA["interest_level"]["threshold"]:
-            score += QUALIFICATION_CRITERIA["interest_level"]["weight"] * 100
-        
-        if score >= 80:
-            return "Hot"
-        elif score >= 50:
-            return "Warm"
-        return "Cold"
-    except:
+    if None in (lead_data.budget, lead_data.timeline, lead_data.interest_level):
         return "Cold"
+    
+    score = (BUDGET_POINTS * (lead_data.budget >= BUDGET_THRESHOLD)
+             + TIMELINE_POINTS * (lead_data.timeline <= TIMELINE_THRESHOLD)
+             + INTEREST_POINTS * (lead_data.interest_level >= INTEREST_THRESHOLD))
+    
+    return "Hot" if score >= 80 else "Warm" if score >= 50 else "Cold"
+
+def generate_sales_notes(lead_data):
+    """Run all sales-note tasks for a lead concurrently"""
+    chain = SALES_NOTES_PROMPT | get_llm("fast70b") | StrOutputParser()
+    notes = chain.batch(
+        [{**asdict(lead_data), "task": task} for task in SALES_NOTES_TASKS.values()],
+        config={"max_concurrency": 10}
+    )
+    return dict(zip(SALES_NOTES_TASKS, notes))
+
+# Conversation Stages
+GREETING = {
+    "question": "Hi there! 👋 Welcome to Opolla. How can we help you today?",
+    "type": "greeting"
+}
+QUALIFY_QUESTIONS = (
+    {"question": "What's your estimated budget for this project? (USD)", "field": "budget", "type": "number"},
+    {"question": "What's your ideal timeline for implementation (in days)?", "field": "timeline", "type": "number"},
+    {"question": "On a scale of 1-10, how urgent is this need?", "field": "interest_level", "type": "scale"}
+)
+CONTACT_QUESTIONS = (
+    {"question": "What's your full name?", "field": "name", "type": "text"},
+    {"question": "What's your email address?", "field": "email", "type": "email"},
+    {"question": "What's the best phone number to reach you?", "field": "phone", "type": "phone"}
+)
+SCHEDULE = {
+    "question": "Would you like to schedule a call with our expert?",
+    "type": "schedule"
+}
+FALLBACK = {"question": "How can I help you today?", "type": "fallback"}
+
+def load_lead_summaries():
+    """Read previously completed handoff summaries from the checkpoint file"""
+    if not os.path.exists(LEAD_SUMMARIES_PATH):
+        return {}
+    summaries = {}
+    with open(LEAD_SUMMARIES_PATH, encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue  # truncated write from an interrupted run; redo that lead
+            summaries[record["lead"]] = record["summary"]
+    return summaries
+
+def lead_key(lead):
+    """Checkpoint key identifying a converted lead"""
+    return f"{lead['email']}:{lead['timestamp']}"
+
+async def summarize_leads(leads, status):
+    """Summarize leads concurrently, reusing any already in the checkpoint file"""
+    summaries = load_lead_summaries()
+    pending = {lead_key(lead): lead for lead in leads if lead_key(lead) not in summaries}
+    pending_keys = list(pending)
+    status.write(f"{len(leads) - len(pending)} of {len(leads)} leads already summarized")
+    
+    # The async client is created per run: its pooled connections are bound to the
+    # event loop started by asyncio.run, so a cached client would break on the next run
+    async with httpx.AsyncClient(
+        limits=httpx.Limits(max_connections=SUMMARY_CONCURRENCY),
+        http2=True,
+        timeout=60
+    ) as http_async_client:
+        llm = ChatGroq(
+            groq_api_key=GROQ_API_KEY,
+            model_name=MODEL_TIERS["fast70b"],
+            temperature=0,
+            http_client=get_http_client(),
+            http_async_client=http_async_client
+        )
+        chain = HANDOFF_PROMPT | llm | StrOutputParser()
+        # Briefs contain lead names and budgets, so the checkpoint is owner-only
+        with open(LEAD_SUMMARIES_PATH, "a", encoding="utf-8",
+                  opener=lambda path, flags: os.open(path, flags, 0o600)) as f:
+            async for i, summary in chain.abatch_as_completed(
+                [pending[key] for key in pending_keys],
+                config={"max_concurrency": SUMMARY_CONCURRENCY}
+            ):
+                key = pending_keys[i]
+                f.write(json.dumps({"lead": key, "summary": summary}) + "\n")
+                f.flush()
+                summaries[key] = summary
+                status.write(f"Summarized {pending[key]['name']}")
+    
+    return {lead_key(lead): summaries[lead_key(lead)] for lead in leads}
 
 def get_next_question():
     """Dynamic question flow with progress tracking"""
-    stages = {
-        "greeting": {
-            "question": "Hi there! 👋 Welcome to Opolla. How can we help you today?",
-            "type": "greeting"
-        },
-        "qualify": [
-            {"question": "What's your estimated budget for this project? (USD)", "field": "budget", "type": "number"},
-            {"question": "What's your ideal timeline for implementation (in days)?", "field": "timeline", "type": "number"},
-            {"question": "On a scale of 1-10, how urgent is this need?", "field": "interest_level", "type": "scale"}
-        ],
-        "contact": [
-            {"question": "What's your full name?", "field": "name", "type": "text"},
-            {"question": "What's your email address?", "field": "email", "type": "email"},
-            {"question": "What's the best phone number to reach you?", "field": "phone", "type": "phone"}
-        ],
-        "schedule": {
-            "question": "Would you like to schedule a call with our expert?",
-            "type": "schedule"
-        }
-    }
-
-    current_stage = st.session_state.conversation_stage
+    lead_data = st.session_state.lead_data
     
-    try:
-        if current_stage == "greeting":
-            return stages["greeting"]
-            
-        if current_stage == "qualify":
-            for q in stages["qualify"]:
-                if q["field"] not in st.session_state.lead_data:
+    match st.session_state.conversation_stage:
+        case "greeting":
+            return GREETING
+        case "qualify":
+            for q in QUALIFY_QUESTIONS:
+                if getattr(lead_data, q["field"]) is None:
                     return q
             st.session_state.conversation_stage = "contact"
             return get_next_question()
-            
-        if current_stage == "contact":
-            for q in stages["contact"]:
-                if q["field"] not in st.session_state.lead_data:
+        case "contact":
+            for q in CONTACT_QUESTIONS:
+                if getattr(lead_data, q["field"]) is None:
                     return q
             st.session_state.conversation_stage = "schedule"
-            return stages["schedule"]
-            
-        if current_stage == "schedule":
-            return stages["schedule"]
-            
-    except Exception as e:
-        st.error(f"Error in conversation flow: {str(e)}")
+            return SCHEDULE
+        case "schedule":
+            return SCHEDULE
     
-    return {"question": "How can I help you today?", "type": "fallback"}
+    return FALLBACK
+
+# Validation Rules (RE2: linear-time matching on user input)
+@st.cache_resource(show_spinner=False)
+def get_validators():
+    """Compile the RE2 validation patterns once per process rather than on every rerun"""
+    return {
+        "email": (
+            re2.compile(r"^[a-zA-Z0-9_.+-]+@[a-zA-Z0-9-]+\.[a-zA-Z0-9-.]+$"),
+            "Please enter a valid email address (e.g., name@company.com)"
+        ),
+        "phone": (
+            re2.compile(r"^\+?[1-9]\d{1,14}$"),
+            "Please enter a valid phone number with country code (e.g., +1234567890)"
+        )
+    }
+
+# Longer inputs would exceed int()'s digit limit (and no real budget/timeline needs them)
+MAX_NUMBER_DIGITS = 15
+NUMBER_MESSAGE = "Please enter a valid number"
+SCALE_MESSAGE = "Please enter a number between 1-10"
 
 def validate_response(response, field_type):
     """Enhanced validation with contextual messages"""
-    validation_rules = {
-        "email": {
-            "pattern": r"^[a-zA-Z0-9_.+-]+@[a-zA-Z0-9-]+\.[a-zA-Z0-9-.]+$",
-            "message": "Please enter a valid email address (e.g., name@company.com)"
-        },
-        "phone": {
-            "pattern": r"^\+?[1-9]\d{1,14}$",
-            "message": "Please enter a valid phone number with country code (e.g., +1234567890)"
-        },
-        "number": {
-            "pattern": r"^\d+$",
-            "message": "Please enter a valid number"
-        },
-        "scale": {
-            "pattern": r"^([1-9]|10)$",
-            "message": "Please enter a number between 1-10"
-        }
-    }
-    
-    if field_type in validation_rules:
-        if not re.match(validation_rules[field_type]["pattern"], response):
-            st.error(validation_rules[field_type]["message"])
+    # Numeric fields only need an ASCII digit check, no regex engine
+    if field_type == "number":
+        if not (response.isascii() and response.isdigit() and len(response) <= MAX_NUMBER_DIGITS):
+            st.error(NUMBER_MESSAGE)
             return False
+        return True
+    if field_type == "scale":
+        if not (response.isascii() and response.isdigit() and len(response) <= 2
+                and 1 <= int(response) <= 10):
+            st.error(SCALE_MESSAGE)
+            return False
+        return True
+    
+    pattern, message = get_validators().get(field_type, (None, None))
+    if pattern is not None and not pattern.match(response):
+        st.error(message)
+        return False
     return True
 
-def track_analytics(event_type, metadata=None):
-    """Track user interactions in session state"""
-    st.session_state.analytics["interactions"].append({
-        "timestamp": datetime.datetime.now().isoformat(),
-        "event_type": event_type,
-        "metadata": metadata or {}
+# Analytics writer appends events to a JSONL log in batches of up to 100,
+# flushing early once the queue has been idle for 100ms
+ANALYTICS_LOG_PATH = "analytics_events.jsonl"
+ANALYTICS_BATCH_SIZE = 100
+ANALYTICS_FLUSH_INTERVAL = 0.1
+
+@st.cache_resource(show_spinner=False)
+def start_analytics_writer():
+    """Start the background analytics writer once and return its event queue"""
+    events = queue.Queue()
+    
+    def write_events():
+        while True:
+            batch = [events.get()]  # block while idle instead of polling
+            try:
+                while len(batch) < ANALYTICS_BATCH_SIZE:
+                    batch.append(events.get(timeout=ANALYTICS_FLUSH_INTERVAL))
+            except queue.Empty:
+                pass
+            
+            # Events carry lead answers, so the log is owner-only
+            try:
+                with open(ANALYTICS_LOG_PATH, "a", encoding="utf-8",
+                          opener=lambda path, flags: os.open(path, flags, 0o600)) as f:
+                    f.writelines(
+                        json.dumps({"t": t, "session": session, "event_type": event_type, "metadata": metadata}) + "\n"
+                        for t, session, event_type, metadata in batch
+                    )
+            except (OSError, TypeError, ValueError):
+                # Drop the batch but keep draining, or the queue would grow unbounded
+                logger.exception("Dropped %d analytics events", len(batch))
+    
+    threading.Thread(target=write_events, name="analytics-writer", daemon=True).start()
+    return events
+
+# Chat messages are rendered to HTML once, when added to the history
+@st.cache_resource(show_spinner=False)
+def get_markdown_renderer():
+    """Build the Markdown parser once per process rather than on every rerun"""
+    return MarkdownIt("commonmark", {"html": False})
+
+def add_message(role, content):
+    """Append a chat message with its pre-rendered HTML"""
+    st.session_state.messages.append({
+        "role": role,
+        "content": content,
+        "html": get_markdown_renderer().render(content)
     })
 
+def record_lead(lead):
+    """Append a converted lead and update the running counters in the same step"""
+    analytics = st.session_state.analytics
+    analytics["lead_scores"].append(lead)
+    analytics["total_leads"] += 1
+    analytics["category_counts"][lead["category"]] += 1
+
+def track_analytics(event_type, metadata=None):
+    """Queue a user interaction for the background analytics writer"""
+    ctx = get_script_run_ctx()
+    start_analytics_writer().put((
+        time.time_ns(),
+        ctx.session_id if ctx else None,
+        event_type,
+        metadata or {}
+    ))
+
 def show_progress():
     """Visual progress indicator"""
     progress_stages = {
@@ -166,17 +381,18 @@ def show_progress():
     
     current_progress = progress_stages.get(st.session_state.conversation_stage, 0)
     
-    st.markdown(f"""
-    <div style="margin: 20px 0; padding: 10px; border-radius: 5px; background: #f0f2f6;">
-        <div style="width: {current_progress}%; 
-                  height: 10px; 
-                  background: #2196F3;
-                  border-radius: 5px; 
-                  transition: width 0.5s ease;">
-        </div>
-        <p style="text-align: center; margin: 5px 0;">Progress: {current_progress}%</p>
-    </div>
-    """, unsafe_allow_html=True)
+    st.progress(current_progress / 100, text=f"Progress: {current_progress}%")
+
+@st.cache_data(show_spinner=False, max_entries=32)
+def leads_to_csv(lead_scores):
+    """Encode collected leads as CSV, recomputed only when the leads change"""
+    df = pd.DataFrame([dict(lead) for lead in lead_scores])
+    # Timestamps are stored as raw nanoseconds; format them only for export
+    if not df.empty:
+        df["timestamp"] = [
+            datetime.datetime.fromtimestamp(ns / 1e9).isoformat() for ns in df["timestamp"]
+        ]
+    return df.to_csv().encode("utf-8")
 
 def main():
     st.set_page_config(page_title="Lead Gen Bot", page_icon="🤖", layout="wide")
@@ -188,70 +404,105 @@ def main():
         show_progress()
         
         # Display chat history
-        for msg in st.session_state.messages:
-            with st.chat_message(msg["role"]):
-                st.markdown(msg["content"])
+        if st.session_state.messages:
+            with st.container(height=400):
+                for msg in st.session_state.messages:
+                    with st.chat_message(msg["role"]):
+                        st.html(msg["html"])
         
-        # Main conversation handler
-        if st.session_state.conversation_stage != "completed":
+        # Main conversation handler: keep advancing within this run instead of rerunning
+        while st.session_state.conversation_stage != "completed":
             next_q = get_next_question()
+            if not (isinstance(next_q, dict) and "type" in next_q):
+                break
             
-            if isinstance(next_q, dict) and "type" in next_q:
-                with st.chat_message("assistant"):
-                    if next_q["type"] == "greeting":
-                        st.markdown(next_q["question"])
-                        st.session_state.conversation_stage = "qualify"
-                        st.rerun()
-                        
-                    elif next_q["type"] == "schedule":
-                        st.markdown(next_q["question"])
-                        col1, col2 = st.columns([1,2])
-                        with col1:
-                            if st.button("✅ Yes, Schedule Now"):
-                                st.session_state.lead_data["scheduled"] = True
-                                track_analytics("meeting_scheduled")
-                                st.rerun()
-                        with col2:
-                            if st.button("❌ No, Later"):
-                                st.session_state.lead_data["scheduled"] = False
-                                track_analytics("meeting_declined")
-                                st.rerun()
+            with st.chat_message("assistant"):
+                if next_q["type"] == "greeting":
+                    st.markdown(next_q["question"])
+                    add_message("assistant", next_q["question"])
+                    st.session_state.conversation_stage = "qualify"
+                    continue
                     
-                    elif "field" in next_q:
-                        input_key = f"input_{next_q['field']}"
-                        user_input = st.text_input(
-                            label=next_q["question"],
-                            key=input_key,
-                            help="Press Enter to submit"
-                        )
-                        if user_input:
-                            if validate_response(user_input, next_q["type"]):
-                                st.session_state.lead_data[next_q["field"]] = user_input
-                                track_analytics("question_answered", {
-                                    "field": next_q["field"],
-                                    "value": user_input
-                                })
-                                st.rerun()
+                elif next_q["type"] == "schedule":
+                    st.markdown(next_q["question"])
+                    yes_col, no_col = st.columns([1,2])
+                    with yes_col:
+                        if st.button("✅ Yes, Schedule Now"):
+                            st.session_state.lead_data.scheduled = True
+                            track_analytics("meeting_scheduled")
+                            add_message("assistant", next_q["question"])
+                            add_message("user", "Yes, schedule now")
+                    with no_col:
+                        if st.button("❌ No, Later"):
+                            st.session_state.lead_data.scheduled = False
+                            track_analytics("meeting_declined")
+                            add_message("assistant", next_q["question"])
+                            add_message("user", "No, later")
+                
+                elif "field" in next_q:
+                    input_key = f"input_{next_q['field']}"
+                    user_input = st.text_input(
+                        label=next_q["question"],
+                        key=input_key,
+                        help="Press Enter to submit"
+                    )
+                    if user_input and validate_response(user_input, next_q["type"]):
+                        value = int(user_input) if next_q["type"] in ("number", "scale") else user_input
+                        setattr(st.session_state.lead_data, next_q["field"], value)
+                        add_message("assistant", next_q["question"])
+                        add_message("user", user_input)
+                        track_analytics("question_answered", {
+                            "field": next_q["field"],
+                            "value": user_input
+                        })
+                        # Each field has its own widget key, so the next question renders inline
+                        continue
+            break
 
         # Final conversion handling
-        required_fields = ["name", "email", "phone", "budget", "timeline", "interest_level"]
-        if all(field in st.session_state.lead_data for field in required_fields):
-            st.session_state.conversation_stage = "completed"
-            category = qualify_lead(st.session_state.lead_data)
-            st.session_state.analytics["lead_scores"].append({
-                **st.session_state.lead_data,
-                "category": category,
-                "timestamp": datetime.datetime.now()
+        # The schedule answer is required too, so conversion waits for the button click
+        required_fields = ["name", "email", "phone", "budget", "timeline", "interest_level", "scheduled"]
+        lead_complete = all(
+            getattr(st.session_state.lead_data, field) is not None for field in required_fields
+        )
+        # Convert (and call the LLM) only once, on the transition into "completed"
+        if lead_complete and st.session_state.conversation_stage != "completed":
+            # Sales notes are optional: an LLM failure must not lose the lead itself
+            try:
+                sales_notes = generate_sales_notes(st.session_state.lead_data)
+            except Exception:
+                sales_notes = dict.fromkeys(SALES_NOTES_TASKS)
+            record_lead({
+                **asdict(st.session_state.lead_data),
+                **sales_notes,
+                "category": qualify_lead(st.session_state.lead_data),
+                "timestamp": time.time_ns()
             })
             track_analytics("conversion")
-            
+            st.session_state.conversation_stage = "completed"
+        
+        if st.session_state.conversation_stage == "completed":
             with st.chat_message("assistant"):
                 st.success(f"""
-                    **Thank you {st.session_state.lead_data['name']}!** 🎉
-                    - We've sent details to {st.session_state.lead_data['email']}
-                    - Our team will call {st.session_state.lead_data['phone']}
+                    **Thank you {st.session_state.lead_data.name}!** 🎉
+                    - We've sent details to {st.session_state.lead_data.email}
+                    - Our team will call {st.session_state.lead_data.phone}
                     - [Schedule follow-up](https://calendly.com)
                 """)
+                
+                # Stream the personalised follow-up once, then replay it from session state
+                if st.session_state.follow_up is None:
+                    chain = FOLLOW_UP_PROMPT | get_llm("instant") | StrOutputParser()
+                    try:
+                        st.session_state.follow_up = st.write_stream(
+                            chain.stream(asdict(st.session_state.lead_data))
+                        )
+                    except Exception:
+                        # Keep the page (and the sidebar controls) rendering if Groq is unavailable
+                        st.session_state.follow_up = FOLLOW_UP_FALLBACK
+                        st.markdown(FOLLOW_UP_FALLBACK)
+                else:
+                    st.markdown(st.session_state.follow_up)
     
     with col2:
         # Analytics and controls
@@ -261,20 +512,36 @@ def main():
             
         st.download_button(
             "💾 Export Leads CSV",
-            pd.DataFrame(st.session_state.analytics["lead_scores"]).to_csv(),
+            leads_to_csv(tuple(
+                tuple(lead.items()) for lead in st.session_state.analytics["lead_scores"]
+            )),
             "leads.csv",
             "text/csv",
             disabled=not st.session_state.analytics["lead_scores"]
         )
         
+        if st.button("📝 Summarize Leads", disabled=not st.session_state.analytics["lead_scores"]):
+            with st.status("Summarizing leads...", expanded=True) as status:
+                st.session_state.lead_summaries = asyncio.run(
+                    summarize_leads(st.session_state.analytics["lead_scores"], status)
+                )
+                status.update(label="Lead summaries ready", state="complete", expanded=False)
+        
+        if st.session_state.lead_summaries:
+            with st.expander("📝 Lead Summaries"):
+                for lead in st.session_state.analytics["lead_scores"]:
+                    summary = st.session_state.lead_summaries.get(lead_key(lead))
+                    if summary:
+                        st.markdown(f"**{lead['name']}**\n\n{summary}")
+        
         # Analytics display
         st.subheader("Real-time Analytics")
-        if st.session_state.analytics["lead_scores"]:
-            df = pd.DataFrame(st.session_state.analytics["lead_scores"])
-            st.metric("Total Leads", len(df))
-            st.metric("Hot Leads", len(df[df["category"] == "Hot"]))
+        if st.session_state.analytics["total_leads"]:
+            category_counts = st.session_state.analytics["category_counts"]
+            st.metric("Total Leads", st.session_state.analytics["total_leads"])
+            st.metric("Hot Leads", category_counts["Hot"])
             st.write("Lead Distribution:")
-            st.bar_chart(df["category"].value_counts())
+            st.bar_chart(pd.Series(category_counts, name="count"))
         else:
             st.info("No leads collected yet")
 